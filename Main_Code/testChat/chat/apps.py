@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        # parsing all the episodes takes a while so only do it when asked to
+        if getattr(settings, "CHAT_PRELOAD_EPISODES", False):
+            from . import views
+            views.preload_episodes()
@@ -0,0 +1,29 @@
+import os
+import pickle
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from chat.views import EPISODE_INDEX_FILE, EPISODE_INDEX_VERSION, episode_files, parse_episode_file
+
+
+class Command(BaseCommand):
+    help = "Parses every episode csv once and pickles the results so the game views dont have to read the csv files. Run it again after changing jeopardy_clue_data, and restart the server afterwards since it only reads the index once."
+
+    def handle(self, *args, **options):
+        index = {}
+        for season_num, show_num, episode_file in episode_files():
+            index[(season_num, show_num)] = parse_episode_file(episode_file)
+
+        # write to a temp file next to the index and swap it in at the end, so the server never sees a half written
+        # index if this gets interrupted or the server starts while it is still writing
+        file = tempfile.NamedTemporaryFile(dir=EPISODE_INDEX_FILE.parent, prefix=EPISODE_INDEX_FILE.name, suffix=".tmp", delete=False)
+        try:
+            with file:
+                pickle.dump({"version": EPISODE_INDEX_VERSION, "episodes": index}, file, protocol=5)
+            os.replace(file.name, EPISODE_INDEX_FILE)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+
+        self.stdout.write(self.style.SUCCESS("Wrote %d episodes to %s, restart the server to use it" % (len(index), EPISODE_INDEX_FILE)))
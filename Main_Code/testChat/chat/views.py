@@ -1,97 +1,203 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
-import csv 
+from django.template.loader import get_template
+from django.utils.html import json_script
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
+from functools import lru_cache, wraps
+import hashlib
+from pathlib import Path
+import pickle
 # Create your views here.
 def index(request):
     return render(request, "chat/index.html")
 
     
 def room(request, room_name):
-    data = {}
-    with open("chat/test.csv", "r") as file:
-        csv_reader = csv.reader(file,delimiter=',')
-        for num,row in enumerate(csv_reader):
-            data[num] = row
-    return render(request, "chat/room.html", {"tempvar": data, "room_name": room_name})
+    # test.csv is served as a static file now and room.html fetches it itself
+    return render(request, "chat/room.html", {"room_name": room_name})
 
 
 
-#game.html will contain jquery that will show various different html depending on host,player, or board
-#i can use var type_html = {{% url 'name' %}}; for example i think.
-def host(request, season_num, show_num):
-    #grab the season and show from url and pass into content to be given back in data sent in
-    #i then use templating like this {{ tempvar|json_script:"csv_data" }} to grab that data within
-    # the html document. quite interesting and cool actually. i dont like using things when
-    # i dont understand where it comes from but since i have no time as i have 3 days i must
-    # allow myself to not know for now.
+# where each part of the board sits in an episode row: (round, section, first column, column after the last)
+# each section ends up as a plain list, game.html numbers clues from 1 so it looks clue n up at n - 1.
+ROW_LAYOUT = [
+    ("single", "categories", 0, 6),
+    ("single", "clues", 6, 36),
+    ("single", "answers", 36, 66),
+    ("double", "categories", 66, 72),
+    ("double", "clues", 72, 102),
+    ("double", "answers", 102, 132),
+]
+FINAL_LAYOUT = [("category", 132), ("clue", 133), ("answer", 134)]
 
 
-    single = {
-        "categories": {},
-        "clues": {},
-        "answers": {},
-    }
-    double = {
-        "categories": {},
-        "clues": {},
-        "answers": {},
-    }
-    final = {}
-
-
-    file_name = "chat/jeopardy_clue_data/season_" + str(season_num) + "/episode_" + str(show_num) + ".csv"
-    with open(file_name, "r") as file:
-        csv_reader = csv.reader(file,delimiter='|')
-        for num,row in enumerate(csv_reader):
-            if num > 0:
-                break
-            data_var = row
-        
-        for clue_num,val in enumerate(data_var):
-            # 0-5 are categories for single
-            if clue_num <= 5:
-                single["categories"][str(clue_num)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 35:
-                key2 = clue_num - 5
-                single["clues"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 65:
-                key2 = clue_num - 35
-                single["answers"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 71:
-                key2 = clue_num - 65
-                double["categories"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 101:
-                key2 = clue_num - 71
-                double["clues"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 131:
-                key2 = clue_num - 101
-                double["answers"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 132:
-                # key2 = clue_num - 131
-                final["category"] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 133:
-                final["clue"] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 134:
-                final["answer"] = val.strip('b').strip("'").strip('"')
-
-
-
-      
-    clues = {
-        "single": single,
-        "double": double,
-        "final": final,
-    }  
+# cells are python bytes reprs like b'...' or b"..." (missing clues are just 0). only take off the b prefix and
+# the matching outer quotes, quotes that are part of the clue itself have to stay.
+def _clean(val):
+    if val.startswith(("b'", 'b"')):
+        if val.endswith(val[1]):
+            return val[2:-1]
+        return val[2:]
+    return val.strip("'\"")
+
 
+def _parse_row(row):
+    clues = {
+        "single": {},
+        "double": {},
+        "final": {},
+    }
+    for round_name, section, start, stop in ROW_LAYOUT:
+        clues[round_name][section] = [_clean(val) for val in row[start:stop]]
+    # some episodes are missing clues so the row can be too short for final jeopardy
+    for key, column in FINAL_LAYOUT:
+        if column < len(row):
+            clues["final"][key] = _clean(row[column])
+    return clues
+
+
+# paths are worked out from this file so they dont depend on where the server was started from
+CHAT_DIR = Path(__file__).resolve().parent
+EPISODE_DATA_DIR = CHAT_DIR / "jeopardy_clue_data"
+# built by "python manage.py build_episode_index", holds every episode already parsed
+EPISODE_INDEX_FILE = CHAT_DIR / "episode_index.pkl"
+# bump this whenever _parse_row changes what an episode looks like, game.html depends on that shape
+# so an index built for a different version is ignored instead of showing the wrong clues.
+EPISODE_INDEX_VERSION = 2
+
+
+def episode_files():
+    for season_dir in EPISODE_DATA_DIR.glob("season_*"):
+        season_num = int(season_dir.name[len("season_"):])
+        for episode_file in season_dir.glob("episode_*.csv"):
+            show_num = int(episode_file.stem[len("episode_"):])
+            yield season_num, show_num, episode_file
+
+
+def parse_episode_file(file_name):
+    # the whole episode is on the first line. nothing in these files is quoted so a plain split gives the
+    # same cells csv.reader would without all its overhead
+    with open(file_name, "rb") as file:
+        data_var = file.readline().decode("utf-8").rstrip('\r\n').split('|')
+    return _parse_row(data_var)
+
+
+# loaded the first time an episode is asked for, if the index hasnt been built (or is out of date or broken) this
+# is just empty and everything gets parsed from the csv files instead. it is only read once so after building the
+# index the server has to be restarted to use it.
+@lru_cache(maxsize=None)
+def _episode_index():
+    try:
+        with open(EPISODE_INDEX_FILE, "rb") as file:
+            index = pickle.load(file)
+    except FileNotFoundError:
+        return {}
+    # a half written or corrupt file, these are what pickle raises for bad data
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, IndexError, ValueError):
+        return {}
+    if not isinstance(index, dict) or index.get("version") != EPISODE_INDEX_VERSION:
+        return {}
+    return index["episodes"]
+
+
+def _load_episode(season_num, show_num):
+    clues = _episode_index().get((season_num, show_num))
+    if clues is not None:
+        return clues
+    # season_num and show_num come from <int:> in urls.py so they can only be digits
+    file_name = EPISODE_DATA_DIR / f"season_{season_num}" / f"episode_{show_num}.csv"
+    try:
+        return parse_episode_file(file_name)
+    except FileNotFoundError:
+        raise Http404("No episode %s in season %s" % (show_num, season_num))
+
+
+# the episode csv files never change so build the <script id="clues"> tag game.html needs once per episode
+# and keep it around, then rendering the page doesnt have to turn the whole clues dict into json every time.
+# there are only so many episodes so the cache is unbounded, that way preloading keeps all of them.
+@lru_cache(maxsize=None)
+def _episode_json_script(season_num, show_num):
+    return json_script(_load_episode(season_num, show_num), "clues")
+
+
+# reads every episode into the cache up front so no request has to touch the disk.
+# called from ChatConfig.ready() when CHAT_PRELOAD_EPISODES is on.
+def preload_episodes():
+    for season_num, show_num, _ in episode_files():
+        _episode_json_script(season_num, show_num)
+
+
+# with DEBUG off django already keeps compiled templates in its cached loader, holding on to game.html here just
+# skips looking it up by name on every render. it also hashes the source that was compiled right then, so the etag
+# follows the game.html that is actually being rendered and not whatever is on disk (a new game.html is only picked
+# up after a restart). with DEBUG on it goes through get_template every time, and the game pages dont get cache
+# headers then either (see _game_page_caching), so changes to it show up without a restart.
+@lru_cache(maxsize=None)
+def _cached_game_template():
+    template = get_template("chat/game.html")
+    return template, hashlib.sha1(template.template.source.encode("utf-8")).hexdigest()
+
+
+def _render_game(request, content):
+    if settings.DEBUG:
+        template = get_template("chat/game.html")
+    else:
+        template, _ = _cached_game_template()
+    return HttpResponse(template.render(content, request))
+
+
+# host and board get the same page and clues, only the type differs
+def _game_view(request, season_num, show_num, view_type):
     content = {
-        "type": "host",
+        "type": view_type,
         "season_num": season_num,
         "show_num": show_num,
-        "clues": clues,
+        "clues_json": _episode_json_script(season_num, show_num),
     }
+    return _render_game(request, content)
 
 
-    
-    return render(request, "chat/game.html",content)
+@lru_cache(maxsize=None)
+def _episode_hash(season_num, show_num):
+    return hashlib.sha1(_episode_json_script(season_num, show_num).encode("utf-8")).hexdigest()
+
+
+# the etag is made from what actually goes into the page, the episode's clues and the game.html being rendered,
+# so it changes whenever either of them does.
+def _game_etag(view_type):
+    def make_etag(request, season_num, show_num):
+        _, template_hash = _cached_game_template()
+        return "%s-%s-%s" % (view_type, _episode_hash(season_num, show_num), template_hash)
+    return make_etag
+
+
+# browsers have to check back every time they load a host or board page, but if nothing changed they just get
+# a 304 back without the page being rendered again. with DEBUG on none of this happens so edits always show up.
+def _game_page_caching(view_type):
+    def decorator(view):
+        checked_view = cache_control(public=True, no_cache=True)(etag(_game_etag(view_type))(view))
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.DEBUG:
+                return view(request, *args, **kwargs)
+            return checked_view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+#game.html will contain jquery that will show various different html depending on host,player, or board
+#i can use var type_html = {{% url 'name' %}}; for example i think.
+@_game_page_caching("host")
+def host(request, season_num, show_num):
+    #grab the season and show from url and pass into content to be given back in data sent in
+    #i then use templating like this {{ tempvar|json_script:"csv_data" }} to grab that data within
+    # the html document. quite interesting and cool actually. i dont like using things when
+    # i dont understand where it comes from but since i have no time as i have 3 days i must
+    # allow myself to not know for now.
+    return _game_view(request, season_num, show_num, "host")
 
 
 def player(request,player_name,player_num):
@@ -101,73 +207,11 @@ def player(request,player_name,player_num):
         "player_name": player_name,
         "player_num": player_num,
     }
-    return render(request,"chat/game.html",content)
+    return _render_game(request, content)
 
 
 #i may need to pass in season_num and show_num for board as well else imay need to send that data to the board
 #person so it can show the clues etc. so maybe better to have the data there as well. probably i think.
+@_game_page_caching("board")
 def board(request,season_num,show_num):
-    single = {
-        "categories": {},
-        "clues": {},
-        "answers": {},
-    }
-    double = {
-        "categories": {},
-        "clues": {},
-        "answers": {},
-    }
-    final = {}
-
-
-    file_name = "chat/jeopardy_clue_data/season_" + str(season_num) + "/episode_" + str(show_num) + ".csv"
-    with open(file_name, "r") as file:
-        csv_reader = csv.reader(file,delimiter='|')
-        for num,row in enumerate(csv_reader):
-            if num > 0:
-                break
-            data_var = row
-        
-        for clue_num,val in enumerate(data_var):
-            # 0-5 are categories for single
-            if clue_num <= 5:
-                single["categories"][str(clue_num)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 35:
-                key2 = clue_num - 5
-                single["clues"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 65:
-                key2 = clue_num - 35
-                single["answers"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 71:
-                key2 = clue_num - 65
-                double["categories"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 101:
-                key2 = clue_num - 71
-                double["clues"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 131:
-                key2 = clue_num - 101
-                double["answers"][str(key2)] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 132:
-                # key2 = clue_num - 131
-                final["category"] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 133:
-                final["clue"] = val.strip('b').strip("'").strip('"')
-            elif clue_num <= 134:
-                final["answer"] = val.strip('b').strip("'").strip('"')
-
-
-
-      
-    clues = {
-        "single": single,
-        "double": double,
-        "final": final,
-    }  
-
-    content = {
-        "type": "board",
-        "season_num": season_num,
-        "show_num": show_num,
-        "clues": clues,
-    }
-    return render(request, "chat/game.html",content)
+    return _game_view(request, season_num, show_num, "board")
@@ -124,6 +124,11 @@ STATIC_URL = 'chat/static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Parse every episode csv into memory at startup instead of on first request.
+# Off by default because it reads every file in chat/jeopardy_clue_data.
+
+CHAT_PRELOAD_EPISODES = False
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",